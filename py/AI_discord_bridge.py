@@ -26,40 +26,59 @@ connection_string = (
 )
 
 # Channels configuration: channel_name -> (SQL query, Discord channel ID)
+# Each query selects the newest unlogged alerts and records them in alert_log in one statement
 channels_config = {
     "spx-alerts": (
         """
-        SELECT TOP 5 id, stock, modulename, ROUND(price, 2) AS price, alerttime, timeperiod
-        FROM esp..a AS a
-        WHERE stock = 'SPX500' AND NOT EXISTS (
-            SELECT 1 FROM discord..alert_log AS log
-            WHERE log.ModuleName = a.ModuleName AND log.Stock = a.Stock AND log.AlertTime = a.AlertTime
-        )
-        ORDER BY alerttime DESC;
+        MERGE discord..alert_log AS log
+        USING (
+            SELECT TOP 5 a.id, a.stock, a.modulename, ROUND(a.price, 2) AS price, a.alerttime, a.timeperiod
+            FROM esp..a AS a
+            LEFT JOIN discord..alert_log AS seen
+                ON seen.ModuleName = a.ModuleName AND seen.Stock = a.Stock AND seen.AlertTime = a.AlertTime
+            WHERE a.stock = 'SPX500' AND seen.ModuleName IS NULL
+            ORDER BY a.alerttime DESC
+        ) AS a
+        ON log.ModuleName = a.modulename AND log.Stock = a.stock AND log.AlertTime = a.alerttime
+        WHEN NOT MATCHED THEN
+            INSERT (ModuleName, Stock, AlertTime) VALUES (a.modulename, a.stock, a.alerttime)
+        OUTPUT a.id, a.stock, a.modulename, a.price, a.alerttime, a.timeperiod;
         """,
         1320395865764008007
     ),
     "spx-alerts-gold": (
         """
-        SELECT TOP 5 id, stock, modulename, ROUND(price, 2) AS price, alerttime, timeperiod
-        FROM esp..a AS a
-        WHERE stock = 'SPX500-GOLD' AND NOT EXISTS (
-            SELECT 1 FROM discord..alert_log AS log
-            WHERE log.ModuleName = a.ModuleName AND log.Stock = a.Stock AND log.AlertTime = a.AlertTime
-        )
-        ORDER BY alerttime DESC;
+        MERGE discord..alert_log AS log
+        USING (
+            SELECT TOP 5 a.id, a.stock, a.modulename, ROUND(a.price, 2) AS price, a.alerttime, a.timeperiod
+            FROM esp..a AS a
+            LEFT JOIN discord..alert_log AS seen
+                ON seen.ModuleName = a.ModuleName AND seen.Stock = a.Stock AND seen.AlertTime = a.AlertTime
+            WHERE a.stock = 'SPX500-GOLD' AND seen.ModuleName IS NULL
+            ORDER BY a.alerttime DESC
+        ) AS a
+        ON log.ModuleName = a.modulename AND log.Stock = a.stock AND log.AlertTime = a.alerttime
+        WHEN NOT MATCHED THEN
+            INSERT (ModuleName, Stock, AlertTime) VALUES (a.modulename, a.stock, a.alerttime)
+        OUTPUT a.id, a.stock, a.modulename, a.price, a.alerttime, a.timeperiod;
         """,
         1320395865764008008
     ),
     "rty-alerts": (
         """
-        SELECT TOP 5 id, stock, modulename, ROUND(price, 2) AS price, alerttime, timeperiod
-        FROM esp..a AS a
-        WHERE stock = 'US2000' AND NOT EXISTS (
-            SELECT 1 FROM discord..alert_log AS log
-            WHERE log.ModuleName = a.ModuleName AND log.Stock = a.Stock AND log.AlertTime = a.AlertTime
-        )
-        ORDER BY alerttime DESC;
+        MERGE discord..alert_log AS log
+        USING (
+            SELECT TOP 5 a.id, a.stock, a.modulename, ROUND(a.price, 2) AS price, a.alerttime, a.timeperiod
+            FROM esp..a AS a
+            LEFT JOIN discord..alert_log AS seen
+                ON seen.ModuleName = a.ModuleName AND seen.Stock = a.Stock AND seen.AlertTime = a.AlertTime
+            WHERE a.stock = 'US2000' AND seen.ModuleName IS NULL
+            ORDER BY a.alerttime DESC
+        ) AS a
+        ON log.ModuleName = a.modulename AND log.Stock = a.stock AND log.AlertTime = a.alerttime
+        WHEN NOT MATCHED THEN
+            INSERT (ModuleName, Stock, AlertTime) VALUES (a.modulename, a.stock, a.alerttime)
+        OUTPUT a.id, a.stock, a.modulename, a.price, a.alerttime, a.timeperiod;
         """,
         1320395865764008009
     )
@@ -75,14 +94,46 @@ bot = discord.Client(intents=intents)
 # Polling interval (seconds)
 POLL_INTERVAL = 60
 
+# One long-lived SQL Server connection per channel, reused across polls
+channel_connections = {}
+
+def get_connection(channel_name):
+    """Return the channel's pooled connection, opening it on first use."""
+    conn = channel_connections.get(channel_name)
+    if conn is None:
+        conn = pyodbc.connect(connection_string, autocommit=False)
+        channel_connections[channel_name] = conn
+    return conn
+
+def fetch_and_log_alerts(channel_name, sql_query):
+    """Fetch new alerts, marking them as logged in the same statement (blocking)."""
+    conn = get_connection(channel_name)
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql_query)
+            rows = cursor.fetchall()
+            conn.commit()
+
+            # OUTPUT rows come back in no particular order; newest first as before
+            rows.sort(key=lambda row: row[4], reverse=True)
+            return rows
+        finally:
+            cursor.close()
+    except pyodbc.Error:
+        # Drop the broken connection so the next poll reconnects
+        channel_connections.pop(channel_name, None)
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        raise
+
 async def fetch_and_post_alerts(channel_name, sql_query, channel_id):
     """Fetch alerts and post them to the specified Discord channel."""
-    conn = None
     try:
-        conn = pyodbc.connect(connection_string)
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
+        # Run the blocking pyodbc work off the event loop so channels can overlap
+        rows = await asyncio.to_thread(fetch_and_log_alerts, channel_name, sql_query)
 
         if rows:
             # Format data
@@ -90,15 +141,6 @@ async def fetch_and_post_alerts(channel_name, sql_query, channel_id):
                 f"{row[0]}, {row[1]}, {row[2]}, {row[3]:.2f}, {row[4]}, {row[5]}"
                 for row in rows
             ])
-            
-            # Insert into logging table
-            insert_query = """
-            INSERT INTO discord..alert_log (ModuleName, Stock, AlertTime)
-            VALUES (?, ?, ?);
-            """
-            for row in rows:
-                cursor.execute(insert_query, (row[2], row[1], row[4]))
-            conn.commit()
 
             # Send to Discord
             channel = bot.get_channel(channel_id)
@@ -108,16 +150,16 @@ async def fetch_and_post_alerts(channel_name, sql_query, channel_id):
             logging.info(f"No new alerts for {channel_name}.")
     except Exception as e:
         logging.error(f"Error processing alerts for {channel_name}: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 @bot.event
 async def on_ready():
     logging.info(f"Bot logged in as {bot.user}")
     while True:
-        for channel_name, (sql_query, channel_id) in channels_config.items():
-            await fetch_and_post_alerts(channel_name, sql_query, channel_id)
+        # Query all channels concurrently; each call handles its own errors
+        await asyncio.gather(*(
+            fetch_and_post_alerts(channel_name, sql_query, channel_id)
+            for channel_name, (sql_query, channel_id) in channels_config.items()
+        ))
         await asyncio.sleep(POLL_INTERVAL)
 
 # Run the bot
@@ -6,6 +6,8 @@ import pyodbc
 import logging
 import asyncio
 import json
+import functools
+import re
 
 # Logging configuration
 logging.basicConfig(
@@ -60,67 +62,116 @@ bot = discord.Client(intents=intents)
 # Polling interval (seconds)
 POLL_INTERVAL = 60
 
+@functools.lru_cache(maxsize=None)
+def get_futures_mapping(stock):
+    """Get the (futures symbol, price adjustment) pair for a mapped stock."""
+    mapping = symbol_mapping[stock]
+    return mapping["futures_symbol"], mapping["price_adjustment"]
+
 def get_futures_symbol_and_adjusted_price(stock, price):
     """Get the futures symbol and adjusted price for the given stock."""
     if stock in symbol_mapping:
-        futures_symbol = symbol_mapping[stock]["futures_symbol"]
-        price_adjustment = symbol_mapping[stock]["price_adjustment"]
-        adjusted_price = price + price_adjustment
-        return futures_symbol, adjusted_price
+        futures_symbol, price_adjustment = get_futures_mapping(stock)
+        return futures_symbol, price + price_adjustment
     return stock, price
 
-def map_module_name(module_name, time_period):
-    """Map the module name to its display name and perform post-processing."""
-    # Step 1: Apply initial mapping
-    if module_name in module_mapping:
-        module_name = module_mapping[module_name]["display_name"]
+def get_duration_factor(display_name):
+    """Get the day factor for a display name mentioning a week or month, or None."""
+    if "week" in display_name:
+        return 7  # Assume 1 week = 7 days
+    if "month" in display_name:
+        return 30  # Assume 1 month = 30 days
+    return None
 
-    # Step 2: Post-process to replace "week" or "month" with calculated time
-    if "week" in module_name or "month" in module_name:
-        if "week" in module_name:
-            factor = 7  # Assume 1 week = 7 days
-            unit = "minutes"
-        elif "month" in module_name:
-            factor = 30  # Assume 1 month = 30 days
-            unit = "minutes"
+# Display name and duration factor for each mapped module, resolved once at startup
+processed_modules = {
+    name: (info["display_name"], get_duration_factor(info["display_name"]))
+    for name, info in module_mapping.items()
+}
 
-        # Calculate new time period
-        calculated_time = time_period * factor
-        module_name = module_name.replace("week", f"{calculated_time} {unit}")
-        module_name = module_name.replace("month", f"{calculated_time} {unit}")
+duration_unit_pattern = re.compile(r"week|month")
 
-    return module_name
+@functools.lru_cache(maxsize=1024)
+def map_module_name(module_name, time_period):
+    """Map the module name to its display name and perform post-processing."""
+    # Step 1: Apply initial mapping
+    display_name, factor = processed_modules.get(module_name) or (module_name, get_duration_factor(module_name))
+
+    # Step 2: Replace "week" or "month" with the calculated time in a single pass
+    if factor is None:
+        return display_name
+    return duration_unit_pattern.sub(f"{time_period * factor} minutes", display_name)
+
+# Bound formatter for one Discord table line: ID|Symbol|Module|Price|AlertTime|TimePeriod
+format_alert_line = "{}|{}|{}|{:.2f}|{}|{}".format
+
+def format_futures_row(row):
+    """Format an alert row with its futures symbol and adjusted price."""
+    futures_symbol, adjusted_price = get_futures_symbol_and_adjusted_price(row[1], row[3])
+    return format_alert_line(row[0], futures_symbol, map_module_name(row[2], row[5]), adjusted_price, row[4], row[5])
+
+def format_row(row):
+    """Format an alert row with its original symbol and price."""
+    return format_alert_line(row[0], row[1], map_module_name(row[2], row[5]), row[3], row[4], row[5])
+
+# One long-lived SQL Server connection per channel, reused across polls
+channel_connections = {}
+
+def get_connection(channel_name):
+    """Return the channel's pooled connection, opening it on first use."""
+    conn = channel_connections.get(channel_name)
+    if conn is None:
+        conn = pyodbc.connect(connection_string, autocommit=False)
+        channel_connections[channel_name] = conn
+    return conn
+
+def fetch_and_log_alerts(channel_name, sql_query):
+    """Run the alert query and record the returned rows in the logging table (blocking)."""
+    conn = get_connection(channel_name)
+    try:
+        cursor = conn.cursor()
+        cursor.fast_executemany = True  # Send batched parameters in a single round-trip
+        try:
+            cursor.execute(sql_query)
+            rows = cursor.fetchall()
+
+            if rows:
+                # Insert into logging table
+                insert_query = """
+                INSERT INTO discord..alert_log (ModuleName, Stock, AlertTime)
+                VALUES (?, ?, ?);
+                """
+                cursor.executemany(insert_query, [(row[2], row[1], row[4]) for row in rows])
+
+            # End the transaction on every poll so an empty SELECT does not hold its locks until the next one
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
+    except pyodbc.Error:
+        # Drop the broken connection so the next poll reconnects
+        channel_connections.pop(channel_name, None)
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        raise
+    except Exception:
+        conn.rollback()
+        raise
 
 async def fetch_and_post_alerts(channel_name, sql_query, channel_id):
     """Fetch alerts and post them to the specified Discord channel."""
-    conn = None
     try:
-        conn = pyodbc.connect(connection_string)
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
+        # Run the blocking pyodbc work off the event loop so channels can overlap
+        rows = await asyncio.to_thread(fetch_and_log_alerts, channel_name, sql_query)
 
         if rows:
             # Format data based on the flag
             if show_futures:
-                table = "\n".join([
-                    f"{row[0]}|{get_futures_symbol_and_adjusted_price(row[1], row[3])[0]}|{map_module_name(row[2], row[5])}|{get_futures_symbol_and_adjusted_price(row[1], row[3])[1]:.2f}|{row[4]}|{row[5]}"
-                    for row in rows if row[1] in symbol_mapping
-                ])
+                table = "\n".join(format_futures_row(row) for row in rows if row[1] in symbol_mapping)
             else:
-                table = "\n".join([
-                    f"{row[0]}|{row[1]}|{map_module_name(row[2], row[5])}|{row[3]:.2f}|{row[4]}|{row[5]}"
-                    for row in rows
-                ])
-            
-            # Insert into logging table
-            insert_query = """
-            INSERT INTO discord..alert_log (ModuleName, Stock, AlertTime)
-            VALUES (?, ?, ?);
-            """
-            for row in rows:
-                cursor.execute(insert_query, (row[2], row[1], row[4]))
-            conn.commit()
+                table = "\n".join(map(format_row, rows))
 
             # Send to Discord
             channel = bot.get_channel(channel_id)
@@ -130,9 +181,6 @@ async def fetch_and_post_alerts(channel_name, sql_query, channel_id):
             logging.info(f"No new alerts for {channel_name}.")
     except Exception as e:
         logging.error(f"Error processing alerts for {channel_name}: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 @bot.event
 async def on_ready():
@@ -158,8 +206,11 @@ async def on_ready():
     logging.info(f"Processing channels: {list(channels_to_process.keys())}")
 
     while True:
-        for channel_name, config in channels_to_process.items():
-            await fetch_and_post_alerts(channel_name, config["sql_query"], config["channel_id"])
+        # Query all channels concurrently; each call handles its own errors
+        await asyncio.gather(*(
+            fetch_and_post_alerts(channel_name, config["sql_query"], config["channel_id"])
+            for channel_name, config in channels_to_process.items()
+        ))
         await asyncio.sleep(POLL_INTERVAL)
 
 # Run the bot
@@ -1,3 +1,4 @@
+import time
 from ib_insync import IB, Position
 from datetime import datetime
 
@@ -11,12 +12,12 @@ def calculate_daily_pnl(ib):
     Returns:
         float: The total realized P&L for the day.
     """
-    today_str = datetime.now().strftime('%Y%m%d')
+    today = datetime.now().date()
     executions = ib.reqExecutions()  # Returns a list of executions
     daily_pnl = 0.0
 
     for execution in executions:  # Iterate through the list of executions
-        if execution.time.strftime('%Y%m%d') == today_str:  # Match today's date
+        if execution.time.date() == today:  # Match today's date
             multiplier = int(execution.contract.multiplier) if execution.contract.multiplier else 1
             trade_pnl = (execution.price * execution.shares * multiplier)
             if execution.side == 'SELL':
@@ -25,6 +26,21 @@ def calculate_daily_pnl(ib):
 
     return daily_pnl
 
+def wait_for_last_prices(ib, tickers, timeout=2):
+    """
+    Wait until every ticker has a last price, returning early instead of sleeping the full timeout.
+
+    Args:
+        ib (IB): An instance of the IB class for interacting with Interactive Brokers API.
+        tickers (list): Tickers returned by reqMktData.
+        timeout (float): Maximum number of seconds to wait.
+    """
+    deadline = time.monotonic() + timeout
+    while not all(ticker.last > 0 for ticker in tickers):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not ib.waitOnUpdate(timeout=remaining):
+            break
+
 def calculate_unrealized_pnl(ib):
     """
     Calculate the unrealized P&L for open positions.
@@ -38,10 +54,13 @@ def calculate_unrealized_pnl(ib):
     unrealized_pnl = 0.0
     positions = ib.positions()
 
-    for position in positions:
+    # Subscribe to every position first, then wait once for all tickers to populate
+    tickers = [(position, ib.reqMktData(position.contract)) for position in positions]
+    wait_for_last_prices(ib, [ticker for _, ticker in tickers])  # Allow data to populate
+
+    for position, ticker in tickers:
         contract = position.contract
-        market_price = ib.reqMktData(contract).last  # Fetch the latest market price
-        ib.sleep(2)  # Allow data to populate
+        market_price = ticker.last  # Latest market price
         if market_price > 0:
             # Calculate P&L: (Market Price - Average Cost) * Quantity * Multiplier
             multiplier = int(contract.multiplier) if contract.multiplier else 1
@@ -2,8 +2,65 @@ import csv
 import os
 import schedule
 import time
+from collections import deque
 from datetime import datetime
-from ib_insync import IB
+from ib_insync import IB, ExecutionFilter
+
+
+# Execution state carried across scheduled runs so each run only fetches new executions
+LAST_EXEC_TS = None  # Time of the newest execution processed (UTC)
+exec_state = {
+    'date': None,             # Trading day the state belongs to
+    'seen_exec_ids': set(),   # Guards against re-processing executions at the filter boundary
+    'trade_tracker': {},      # FIFO queue of open executions per contract
+    'trades': [],             # Completed trades for the day
+    'realized_pnl': 0.0       # Running realized P&L for the day
+}
+
+# Contract multiplier per symbol, parsed on first sight
+contract_multipliers = {}
+
+
+def get_multiplier(contract):
+    """
+    Return the contract's integer multiplier (1 if unset), cached per symbol.
+
+    Args:
+        contract (Contract): The IB contract.
+
+    Returns:
+        int: The contract multiplier.
+    """
+    multiplier = contract_multipliers.get(contract.symbol)
+    if multiplier is None:
+        multiplier = int(contract.multiplier) if contract.multiplier else 1
+        contract_multipliers[contract.symbol] = multiplier
+    return multiplier
+
+
+def read_last_csv_row(file_path, block_size=512):
+    """
+    Read the last non-empty row of a CSV file by seeking to its end instead of parsing every row.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        block_size (int): Number of bytes to read from the end of the file.
+
+    Returns:
+        list: The last row's fields, or None if the file is missing or empty.
+    """
+    try:
+        with open(file_path, mode='rb') as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(0, file.tell() - block_size))
+            tail = file.read().decode('utf-8')
+    except FileNotFoundError:
+        return None  # File does not exist yet, so no duplicates possible
+
+    lines = [line for line in tail.splitlines() if line.strip()]
+    if not lines:
+        return None
+    return next(csv.reader([lines[-1]]))
 
 
 def calculate_daily_pnl(ib, trades_file='trades.csv', total_pnl_file='total_pnl.csv'):
@@ -19,91 +76,112 @@ def calculate_daily_pnl(ib, trades_file='trades.csv', total_pnl_file='total_pnl.
     Returns:
         tuple: Realized P&L, Unrealized P&L, Total P&L for the day.
     """
-    today_str = datetime.now().strftime('%Y%m%d')  # Today's date in 'YYYYMMDD'
-    executions = ib.reqExecutions()  # Fetch executions
+    global LAST_EXEC_TS
+
+    # Start from scratch on a new trading day
+    today = datetime.now().date()
+    if exec_state['date'] != today:
+        LAST_EXEC_TS = None
+        exec_state.update(date=today, seen_exec_ids=set(), trade_tracker={}, trades=[], realized_pnl=0.0)
+
+    # Ask TWS only for executions since the last run (filter time in UTC)
+    if LAST_EXEC_TS is None:
+        exec_filter = ExecutionFilter()
+    else:
+        exec_filter = ExecutionFilter(time=LAST_EXEC_TS.strftime('%Y%m%d-%H:%M:%S'))
+    executions = ib.reqExecutions(exec_filter)  # Fetch executions
     print("Executions fetched:")
 
-    if not executions:  # Check if executions list is empty
+    trades = exec_state['trades']
+    trade_tracker = exec_state['trade_tracker']
+    seen_exec_ids = exec_state['seen_exec_ids']
+
+    if not executions and not trades and not trade_tracker:  # Nothing executed today
         print("No trades executed today.")
         return 0.0, 0.0, 0.0
 
-    # Group trades by contract and side (entry/exit)
-    trades = []
-    trade_tracker = {}  # To track open trades by contract
-
     print("\nProcessing Executions:")
     for execution in executions:
         try:
+            exec_id = execution.execution.execId
+            if exec_id in seen_exec_ids:
+                continue
+            seen_exec_ids.add(exec_id)
+
             # Extract details
             symbol = execution.contract.symbol
-            multiplier = int(execution.contract.multiplier) if execution.contract.multiplier else 1
+            multiplier = get_multiplier(execution.contract)
             price = execution.execution.price
             side = execution.execution.side
             shares = execution.execution.shares
             time = execution.execution.time
             pnl = 0.0
+            if LAST_EXEC_TS is None or time > LAST_EXEC_TS:
+                LAST_EXEC_TS = time
 
             # Identify entry/exit and pair trades
-            if symbol not in trade_tracker:
-                trade_tracker[symbol] = []
-
-            # Add the trade details
-            trade_tracker[symbol].append({
-                'time': time,
-                'price': price,
-                'side': side,
-                'shares': shares,
-                'pnl': None  # Placeholder for P&L calculation
-            })
-
-            # If we have both entry and exit, calculate P&L
-            if len(trade_tracker[symbol]) >= 2:
-                entry = trade_tracker[symbol].pop(0)  # Remove the oldest trade
-                exit_trade = trade_tracker[symbol][-1]
+            open_trades = trade_tracker.setdefault(symbol, deque())
+
+            # An opposite-side execution closes the oldest open trade (FIFO)
+            if open_trades and open_trades[0]['side'] != side:
+                entry = open_trades.popleft()
 
                 # Calculate P&L: (Exit Price - Entry Price) * Shares * Multiplier
-                pnl = (exit_trade['price'] - entry['price']) * entry['shares'] * multiplier
+                pnl = (price - entry['price']) * entry['shares'] * multiplier
                 if entry['side'] == 'SLD':  # Reverse P&L for short trades
                     pnl = -pnl
 
                 # Store completed trade
+                exec_state['realized_pnl'] += pnl
                 trades.append({
                     'symbol': symbol,
                     'entry_time': entry['time'],
-                    'exit_time': exit_trade['time'],
+                    'exit_time': time,
                     'entry_price': entry['price'],
-                    'exit_price': exit_trade['price'],
+                    'exit_price': price,
                     'pnl': pnl
                 })
+            else:
+                # Otherwise this execution opens (or adds to) a position
+                open_trades.append({
+                    'time': time,
+                    'price': price,
+                    'side': side,
+                    'shares': shares
+                })
 
         except Exception as e:
             print(f"An error occurred while processing execution: {e}")
 
     # Write trades to CSV
     with open(trades_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=['Symbol', 'Entry Time', 'Entry Price', 'Exit Time', 'Exit Price', 'P&L'])
-        writer.writeheader()
-        for trade in trades:
-            writer.writerow({
-                'Symbol': trade['symbol'],
-                'Entry Time': trade['entry_time'],
-                'Entry Price': f"{trade['entry_price']:.2f}",
-                'Exit Time': trade['exit_time'],
-                'Exit Price': f"{trade['exit_price']:.2f}",
-                'P&L': f"{trade['pnl']:.2f}"
-            })
-
-    # Calculate realized P&L
-    realized_pnl = sum(trade['pnl'] for trade in trades)
+        writer = csv.writer(file)
+        writer.writerow(['Symbol', 'Entry Time', 'Entry Price', 'Exit Time', 'Exit Price', 'P&L'])
+        writer.writerows(
+            (
+                trade['symbol'],
+                trade['entry_time'],
+                f"{trade['entry_price']:.2f}",
+                trade['exit_time'],
+                f"{trade['exit_price']:.2f}",
+                f"{trade['pnl']:.2f}"
+            )
+            for trade in trades
+        )
+
+    # Realized P&L accumulated across runs
+    realized_pnl = exec_state['realized_pnl']
 
     # Calculate unrealized P&L
     unrealized_pnl = 0.0
     positions = ib.positions()  # Fetch open positions
-    for position in positions:
+    # Snapshot all positions in one batched request rather than one round-trip each
+    tickers = ib.reqTickers(*[position.contract for position in positions]) if positions else []
+    for position, ticker in zip(positions, tickers):
         contract = position.contract
-        market_price = ib.reqMktData(contract).last  # Fetch the latest market price
-        if market_price:
-            multiplier = int(contract.multiplier) if contract.multiplier else 1
+        market_price = ticker.marketPrice()
+        if market_price > 0:  # Skips positions whose price is still unavailable (nan)
+            multiplier = get_multiplier(contract)
             unrealized_pnl += (market_price - position.avgCost) * position.position * multiplier
 
     # Calculate total P&L
@@ -111,14 +189,7 @@ def calculate_daily_pnl(ib, trades_file='trades.csv', total_pnl_file='total_pnl.
 
     # Append to total P&L CSV
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    last_row = None
-    try:
-        with open(total_pnl_file, mode='r') as file:
-            rows = list(csv.reader(file))
-            if len(rows) > 1:  # Check if there are rows beyond the header
-                last_row = rows[-1]
-    except FileNotFoundError:
-        pass  # File does not exist yet, so no duplicates possible
+    last_row = read_last_csv_row(total_pnl_file)
 
     # Append only if this is not a duplicate
     if last_row is None or last_row[0] != current_time:
@@ -136,14 +207,24 @@ def calculate_daily_pnl(ib, trades_file='trades.csv', total_pnl_file='total_pnl.
     return realized_pnl, unrealized_pnl, total_pnl
 
 
+# The reporter holds its connection for the life of the process, so it needs a client ID
+# of its own; 1 and 2 are used by the trading bridges. Override with PNL_CLIENT_ID.
+PNL_CLIENT_ID = int(os.environ.get('PNL_CLIENT_ID', 10))
+
+# Persistent IB connection shared by every scheduled job
+shared_ib = IB()
+shared_ib.disconnectedEvent += lambda: print("Disconnected from IB; reconnecting on the next run.")
+
+
 def job():
     """
     Job to be executed every 5 minutes.
     """
-    ib = IB()
+    ib = shared_ib
     try:
-        # Connect to IB Gateway or TWS
-        ib.connect('127.0.0.1', 7496, clientId=2)
+        # Connect to IB Gateway or TWS only if not already connected
+        if not ib.isConnected():
+            ib.connect('127.0.0.1', 7496, clientId=PNL_CLIENT_ID)
 
         # Define file paths
         trades_file = os.path.abspath(os.path.join("..", "reports", "trades.csv"))
@@ -156,8 +237,7 @@ def job():
         calculate_daily_pnl(ib, trades_file=trades_file, total_pnl_file=total_pnl_file)
     except Exception as e:
         print(f"An error occurred: {e}")
-    finally:
-        # Disconnect from IB
+        # Drop a possibly broken connection so the next run starts clean
         ib.disconnect()
 
 
@@ -166,6 +246,12 @@ if __name__ == "__main__":
     schedule.every(5).minutes.do(job)
 
     print("Scheduler started. Running the job every 5 minutes.")
-    while True:
-        # schedule.run
-        schedule.run_pending()
+    try:
+        while True:
+            schedule.run_pending()
+            # Sleep until the next job is due (capped at 60s) instead of busy-waiting
+            delay = schedule.idle_seconds()
+            time.sleep(60 if delay is None else min(max(delay, 0), 60))
+    finally:
+        # Disconnect from IB
+        shared_ib.disconnect()
@@ -55,9 +55,11 @@ def log_1min_ohlc_to_csv(symbol, bars, log_file):
             if file.tell() == 0:
                 writer.writerow(["Date", "Time", "Open", "High", "Low", "Close", "Volume"])
             
-            for bar in bars:
-                date, time = bar.date.strftime('%Y/%m/%d'), bar.date.strftime('%H:%M')
-                writer.writerow([date, time, bar.open, bar.high, bar.low, bar.close, bar.volume])
+            # One strftime per bar, split into the Date and Time columns, written in a single batch
+            writer.writerows(
+                (*bar.date.strftime('%Y/%m/%d %H:%M').split(' '), bar.open, bar.high, bar.low, bar.close, bar.volume)
+                for bar in bars
+            )
         print(f"Logged {len(bars)} 1-minute bars for {symbol} to CSV")
     except Exception as e:
         print(f"Error writing to CSV: {e}")
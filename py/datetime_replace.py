@@ -10,6 +10,15 @@ class AlertProcessor:
         self.time_period_dict = time_period_dict
         self.time_period = time_period
 
+        # Build the duration pattern once; longest keys first so e.g. "155 minutes" wins over "55 minutes"
+        sorted_keys = sorted(time_period_dict.keys(), key=len, reverse=True)
+        self._pattern = re.compile(r"|".join(re.escape(key) for key in sorted_keys), re.IGNORECASE)
+        # Keywords and the base multiplier are fixed, so format every replacement up front
+        self._formatted = {
+            key.lower(): self.format_duration(value * time_period)
+            for key, value in time_period_dict.items()
+        }
+
     def calculate_minutes(self, time_period):
         """
         Convert the time period to minutes using the time period dictionary and base multiplier.
@@ -42,17 +51,16 @@ class AlertProcessor:
         :param alert_text: The alert text to process.
         :return: The processed alert text with replacements.
         """
-        def replace_match(match):
-            duration = match.group(0)
-            base_units = self.time_period_dict.get(duration.lower(), None)
-            if base_units is not None:
-                total_minutes = base_units * self.time_period
-                return self.format_duration(total_minutes)
-            return duration  # Default to original if no match
+        return self._pattern.sub(self._replace_match, alert_text)
 
-        # Build a regex pattern from the dictionary keys
-        pattern = r"|".join(re.escape(key) for key in self.time_period_dict.keys())
-        return re.sub(pattern, replace_match, alert_text)
+    def _replace_match(self, match):
+        """
+        Substitute a single matched duration with its formatted equivalent.
+        :param match: The regex match for a time period keyword.
+        :return: The formatted duration, or the original text if the keyword is unknown.
+        """
+        duration = match.group(0)
+        return self._formatted.get(duration.lower(), duration)  # Default to original if no match
 
     def process_alerts(self, alert_data):
         """
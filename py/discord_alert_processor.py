@@ -6,10 +6,22 @@ import asyncio
 import json
 import os
 import re
+import functools
+from datetime import datetime
+from math import floor
 
 # ----------------------------------------
 # 1. Configuration Management
 # ----------------------------------------
+@functools.lru_cache(maxsize=32)
+def _load_json_cached(file_path, mtime):
+    """
+    Parses a JSON file; the modification time is part of the cache key so edits are picked up.
+    """
+    with open(file_path, "r") as file:
+        return json.load(file)
+
+
 class ConfigManager:
     """
     Loads JSON configuration files from a specified directory.
@@ -31,8 +43,7 @@ class ConfigManager:
         file_path = os.path.join(self.config_dir, file_name)
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Configuration file not found: {file_path}")
-        with open(file_path, "r") as file:
-            return json.load(file)
+        return _load_json_cached(file_path, os.path.getmtime(file_path))
 
 
 # ----------------------------------------
@@ -75,12 +86,30 @@ class DatabaseManager:
             f"UID={database_config['UID']};"
             f"PWD={database_config['PWD']};"
         )
+        # Long-lived connections by key (one per channel), since pyodbc connections
+        # must not be used from several threads at once
+        self._connections = {}
+
+    def get_connection(self, key=None):
+        """
+        Returns the long-lived pyodbc connection for the given key, opening it on first use.
+        """
+        conn = self._connections.get(key)
+        if conn is None:
+            conn = pyodbc.connect(self.connection_string)
+            self._connections[key] = conn
+        return conn
 
-    def get_connection(self):
+    def reset_connection(self, key=None):
         """
-        Returns a new pyodbc connection using the configured connection string.
+        Closes and discards the connection for the given key so the next call reconnects.
         """
-        return pyodbc.connect(self.connection_string)
+        conn = self._connections.pop(key, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except pyodbc.Error:
+                pass
 
 
 # ----------------------------------------
@@ -92,10 +121,26 @@ class AlertProcessor:
       - Duration replacement (e.g., day/week/month -> calculated minutes)
       - Symbol lookup and price adjustment based on configuration
     """
+    # Matches durations such as "3 day", "2 week" or "6 month" in module names
+    _DURATION_RE = re.compile(r"(\d+)\s*(day|week|month)")
+
+    # One Discord table line: ID|Symbol|ModuleName|Price|Timestamp|TimePeriod
+    _LINE_FORMAT = "{}|{}|{}|{:.2f}|{}|{}"
+
     def __init__(self, module_mapping, symbol_settings):
         self.module_mapping = module_mapping
         self.symbol_settings = symbol_settings
 
+        # Flattened lookups so the per-row path avoids nested dict traversal
+        self._display_names = {
+            name: info.get("display_name", name) for name, info in module_mapping.items()
+        }
+        self._mappings = symbol_settings["mappings"]
+        self._show_futures = symbol_settings["settings"].get("show_futures", False)
+
+        # Mapped module names by (ModuleName, TimePeriod); both are low-cardinality
+        self._module_name_cache = {}
+
     def replace_duration(self, match, time_period):
         """
         Replace day/week/month in a string with the calculated minutes.
@@ -116,6 +161,24 @@ class AlertProcessor:
             return f"{minutes} minutes"
         return match.group(0)
 
+    def map_module_name(self, module_name, time_period):
+        """
+        Map a ModuleName to its display name with durations converted, computing each pair once.
+        """
+        key = (module_name, time_period)
+        mapped_module_name = self._module_name_cache.get(key)
+        if mapped_module_name is None:
+            # Map the ModuleName using module_mapping
+            mapped_module_name = self._display_names.get(module_name, module_name)
+
+            # Replace durations in ModuleName
+            mapped_module_name = self._DURATION_RE.sub(
+                functools.partial(self.replace_duration, time_period=time_period),
+                mapped_module_name
+            )
+            self._module_name_cache[key] = mapped_module_name
+        return mapped_module_name
+
     def lookup_symbol_and_adjust_price(self, row):
         """
         Perform symbol lookup, price adjustment, and module name mapping.
@@ -123,37 +186,23 @@ class AlertProcessor:
         # Row structure: (ID, Symbol, ModuleName, Price, Timestamp, TimePeriod)
         original_symbol = row[1]
         original_price = row[3]
-        original_module_name = row[2]
-        time_period = int(row[5])
-
-        # Map the ModuleName using module_mapping
-        mapped_module_name = self.module_mapping.get(original_module_name, {}).get("display_name", original_module_name)
-
-        # Replace durations in ModuleName
-        mapped_module_name = re.sub(
-            r"(\d+)\s*(day|week|month)",
-            lambda m: self.replace_duration(m, time_period),
-            mapped_module_name
-        )
-
-        show_futures = self.symbol_settings["settings"].get("show_futures", False)
-        mappings = self.symbol_settings["mappings"]
+        mapped_module_name = self.map_module_name(row[2], int(row[5]))
 
         # Adjust symbol & price if show_futures is enabled and symbol is found in mappings
-        if show_futures and original_symbol in mappings:
-            mapping = mappings[original_symbol]
+        if self._show_futures and original_symbol in self._mappings:
+            mapping = self._mappings[original_symbol]
             adjusted_symbol = mapping["futures_symbol"]
             price_adjustment = mapping.get("price_adjustment", 0)
             adjusted_price = original_price + price_adjustment
 
-            # Round the price to the nearest quarter
-            adjusted_price = round(adjusted_price * 4) / 4
+            # Round the price to the nearest quarter (halves round up)
+            adjusted_price = floor(adjusted_price * 4 + 0.5) * 0.25
 
             return (
                 row[0],
                 adjusted_symbol,
                 mapped_module_name,
-                f"{adjusted_price:.2f}",
+                adjusted_price,
                 row[4],
                 row[5]
             )
@@ -162,11 +211,23 @@ class AlertProcessor:
                 row[0],
                 original_symbol,
                 mapped_module_name,
-                f"{original_price:.2f}",
+                original_price,
                 row[4],
                 row[5]
             )
 
+    def format_alert_line(self, row):
+        """
+        Adjust a raw alert row and format it as one line of the Discord table.
+        """
+        return self._LINE_FORMAT.format(*self.lookup_symbol_and_adjust_price(row))
+
+    def format_alert_table(self, rows):
+        """
+        Adjust and format a batch of alert rows as the Discord table body.
+        """
+        return "\n".join(map(self.format_alert_line, rows))
+
 
 # ----------------------------------------
 # 5. Discord Bot
@@ -194,6 +255,12 @@ class AlertBot(discord.Client):
         # For command-line channels
         self.passed_channels = set(sys.argv[1:])
 
+        # Discord Channel objects by channel ID, resolved once in on_ready
+        self._channels = {}
+
+        # Newest AlertTime posted per channel, bound to incremental channel queries
+        self._last_seen = {}
+
     async def on_ready(self):
         logging.info(f"Bot logged in as {self.user}")
         
@@ -212,63 +279,102 @@ class AlertBot(discord.Client):
             return
 
         logging.info(f"Processing channels: {list(channels_to_process.keys())}")
-        
-        # Start the periodic task
+
+        # Resolve the Discord channels once instead of on every poll
+        self._channels = {
+            ch_config["channel_id"]: self.get_channel(ch_config["channel_id"])
+            for ch_config in channels_to_process.values()
+        }
+
+        # Start the periodic task, polling all channels concurrently
         while True:
-            for channel_name, ch_config in channels_to_process.items():
-                await self.fetch_and_post_alerts(channel_name, ch_config["sql_query"], ch_config["channel_id"])
+            await asyncio.gather(*(
+                self.fetch_and_post_alerts(channel_name, ch_config)
+                for channel_name, ch_config in channels_to_process.items()
+            ))
             await asyncio.sleep(self.poll_interval)
 
-    async def fetch_and_post_alerts(self, channel_name, sql_query, channel_id):
+    def fetch_and_log_alerts(self, channel_name, ch_config):
         """
-        Fetch alerts from the database, process them, and post them to Discord.
+        Fetch new alerts for a channel and record them in the logging table.
+        Blocking; runs in a worker thread on the channel's own connection.
+
+        Channels configured with "incremental": true have a query with a single "?"
+        placeholder (e.g. "AND a.AlertTime > ?"), bound to the newest AlertTime already
+        seen for that channel so each poll only scans the recent range. The watermark
+        only advances when the batch came back smaller than the query's TOP limit
+        ("batch_limit", default 5); a full batch may have cut off older unlogged alerts,
+        which the next poll then picks up from the same watermark.
         """
-        conn = None
+        sql_query = ch_config["sql_query"]
+        incremental = ch_config.get("incremental", False)
+        conn = self.db_manager.get_connection(channel_name)
+        cursor = conn.cursor()
         try:
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(sql_query)
+            if incremental:
+                cursor.execute(sql_query, self._last_seen.get(channel_name, datetime(1900, 1, 1)))
+            else:
+                cursor.execute(sql_query)
             rows = cursor.fetchall()
 
             if rows:
-                # Process each row
-                adjusted_rows = [self.alert_processor.lookup_symbol_and_adjust_price(row) for row in rows]
-
-                # Format data for Discord output
-                table = "\n".join([
-                    f"{r[0]}|{r[1]}|{r[2]}|{r[3]}|{r[4]}|{r[5]}"
-                    for r in adjusted_rows
-                ])
-
-                # Insert into logging table
+                # Insert into logging table in one batch; rows already logged are skipped in SQL
                 insert_query = """
-                    INSERT INTO discord..alert_log (ModuleName, Stock, AlertTime)
-                    VALUES (?, ?, ?);
+                    MERGE discord..alert_log AS log
+                    USING (SELECT ? AS ModuleName, ? AS Stock, ? AS AlertTime) AS src
+                    ON log.ModuleName = src.ModuleName AND log.Stock = src.Stock AND log.AlertTime = src.AlertTime
+                    WHEN NOT MATCHED THEN
+                        INSERT (ModuleName, Stock, AlertTime) VALUES (src.ModuleName, src.Stock, src.AlertTime);
                 """
-                for original_row in rows:  # Use the original ModuleName here
-                    try:
-                        cursor.execute(insert_query, (original_row[2], original_row[1], original_row[4]))
-                    except pyodbc.IntegrityError:
-                        logging.warning(
-                            f"Duplicate detected, skipping: {original_row[2]}, "
-                            f"{original_row[1]}, {original_row[4]}"
-                        )
-                        continue
-
-                conn.commit()
+                # Use the original ModuleName here
+                params = [(original_row[2], original_row[1], original_row[4]) for original_row in rows]
+                cursor.fast_executemany = True
+                try:
+                    cursor.executemany(insert_query, params)
+                except pyodbc.IntegrityError as e:
+                    logging.warning(f"Duplicate detected while logging alerts for {channel_name}: {e}")
+
+            # End the transaction on every poll so an empty SELECT does not hold its locks until the next one
+            conn.commit()
+            if incremental and rows and len(rows) < ch_config.get("batch_limit", 5):
+                newest = max(row[4] for row in rows)
+                self._last_seen[channel_name] = max(newest, self._last_seen.get(channel_name, newest))
+            return rows
+        except Exception:
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                pass  # The caller resets a broken connection
+            raise
+        finally:
+            cursor.close()
+
+    async def fetch_and_post_alerts(self, channel_name, ch_config):
+        """
+        Fetch alerts from the database, process them, and post them to Discord.
+        """
+        try:
+            # Run the blocking database work off the event loop so channels overlap
+            rows = await asyncio.to_thread(self.fetch_and_log_alerts, channel_name, ch_config)
+
+            if rows:
+                # Process and format each row for Discord output in a single pass
+                table = self.alert_processor.format_alert_table(rows)
 
                 # Send to Discord
-                channel = self.get_channel(channel_id)
+                channel_id = ch_config["channel_id"]
+                channel = self._channels.get(channel_id) or self.get_channel(channel_id)
                 if channel:
                     await channel.send(f"{channel_name} Alerts:\n```\n{table}\n```")
             else:
                 logging.info(f"No new alerts for {channel_name}.")
 
+        except pyodbc.Error as e:
+            logging.error(f"Database error processing alerts for {channel_name}: {e}")
+            # Drop the connection so the next poll reconnects
+            self.db_manager.reset_connection(channel_name)
         except Exception as e:
             logging.error(f"Error processing alerts for {channel_name}: {e}")
-        finally:
-            if conn:
-                conn.close()
 
 
 # ----------------------------------------
@@ -1,4 +1,5 @@
 import requests
+import orjson
 import time
 import os
 
@@ -8,29 +9,57 @@ asp_url = "http://185.17.196.243/cbt/findnewtrades.asp?symbol=SPX&username=noel&
 # File to store the last processed ID
 last_processed_file = "last_processed_id.txt"
 
-def read_last_processed_id():
-    """Read the last processed ID from the file."""
-    if os.path.exists(last_processed_file):
-        with open(last_processed_file, "r") as file:
-            try:
+# Persistent HTTP session so each poll reuses the same keep-alive connection
+session = requests.Session()
+
+# Validators from the last response, sent back so unchanged polls return 304 Not Modified
+conditional_headers = {}
+# Trade ideas from that response, replayed on a 304 so ideas a failed batch left unprocessed are retried
+cached_trade_ideas = []
+
+class LastIdStore:
+    """Keep the last processed ID in memory and persist it atomically when it changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.value = self._load()
+
+    def _load(self):
+        """Read the last processed ID from the file."""
+        try:
+            with open(self.path, "r") as file:
                 return int(file.read().strip())
-            except ValueError:
-                return None
-    return None
+        except (FileNotFoundError, ValueError):
+            return None
 
-def write_last_processed_id(last_id):
-    """Write the last processed ID to the file."""
-    with open(last_processed_file, "w") as file:
-        file.write(str(last_id))
+    def set(self, last_id):
+        """Write the last processed ID to the file, skipping unchanged values."""
+        if last_id == self.value:
+            return
+        # Write to a temp file and rename so a crash never leaves a torn file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(str(last_id))
+        os.replace(tmp_path, self.path)
+        self.value = last_id
 
 def fetch_trade_ideas():
     """Fetch trade ideas from the ASP script."""
     try:
-        response = requests.get(asp_url)
+        response = session.get(asp_url, headers=conditional_headers, timeout=10)
+        if response.status_code == 304:
+            return list(cached_trade_ideas)  # Nothing has changed since the last poll
         response.raise_for_status()  # Raise an exception for HTTP errors
-        trade_ideas = response.json()
+        trade_ideas = orjson.loads(response.content)
+        # Remember the ideas and validators for the next conditional request
+        cached_trade_ideas[:] = trade_ideas
+        conditional_headers.clear()
+        if "ETag" in response.headers:
+            conditional_headers["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            conditional_headers["If-Modified-Since"] = response.headers["Last-Modified"]
         return trade_ideas
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching trade ideas: {e}")
         return []
 
@@ -43,24 +72,30 @@ def process_trade_idea(trade):
 
 def poll_asp_script():
     """Poll the ASP script for new trade ideas."""
-    last_processed_id = read_last_processed_id()
+    last_processed_store = LastIdStore(last_processed_file)
+    last_processed_id = last_processed_store.value
 
     while True:
         print("Polling for new trade ideas...")
         trade_ideas = fetch_trade_ideas()
 
         if trade_ideas:
-            # Sort trade ideas by ID to ensure correct processing order
-            trade_ideas = sorted(trade_ideas, key=lambda x: x['ID'])
-
+            # Coerce IDs to int once, then sort by ID to ensure correct processing order
             for trade in trade_ideas:
-                # Ignore trades with IDs <= last_processed_id
-                if last_processed_id is None or int(trade['ID']) > last_processed_id:
-                    process_trade_idea(trade)
-                    last_processed_id = int(trade['ID'])  # Update the last processed ID
-                    write_last_processed_id(last_processed_id)  # Persist to file
-                else:
-                    print(f"Ignoring Trade ID {trade['ID']} (already processed)")
+                trade['ID'] = int(trade['ID'])
+            trade_ideas.sort(key=lambda x: x['ID'])
+
+            try:
+                for trade in trade_ideas:
+                    # Ignore trades with IDs <= last_processed_id
+                    if last_processed_id is None or trade['ID'] > last_processed_id:
+                        process_trade_idea(trade)
+                        last_processed_id = trade['ID']  # Update the last processed ID
+                    else:
+                        print(f"Ignoring Trade ID {trade['ID']} (already processed)")
+            finally:
+                # Persist to file once per batch, even if a trade failed part-way through
+                last_processed_store.set(last_processed_id)
         else:
             print("No new trade ideas found.")
 
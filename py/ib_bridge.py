@@ -2,48 +2,96 @@ import os
 import sys
 import time
 import requests
+import orjson
+import copy
+import functools
 import configparser
-from ib_insync import IB, Future, LimitOrder, StopOrder, Order
+from collections import Counter
+from types import SimpleNamespace
+from ib_insync import IB, Future, LimitOrder, StopOrder
 
 
 # Configuration for ASP script
 asp_url = "http://185.17.196.243/cbt/findnewtrades.asp?symbol=SPX&username=noel&password=noel1985"
 last_processed_file = "last_processed_id.txt"
 
+# Persistent HTTP session so each poll reuses the same keep-alive connection
+session = requests.Session()
+
+# Validators from the last response, sent back so unchanged polls return 304 Not Modified
+conditional_headers = {}
+# Trade ideas from that response, replayed on a 304 so ideas a failed batch left unprocessed are retried
+cached_trade_ideas = []
+
 # Symbol mapping: Convert SPX to MES (Micro E-mini S&P 500 Futures)
 symbol_map = {
     "SPX": "MES"
 }
 
-def read_last_processed_id():
-    """Read the last processed ID from the file."""
-    if os.path.exists(last_processed_file):
-        with open(last_processed_file, "r") as file:
-            try:
-                return int(file.read().strip())
-            except ValueError:
-                return None
-    return None
+# Qualified contracts keyed by (symbol, expiry, exchange, currency)
+qualified_contract_cache = {}
+
+# Open order bookkeeping, kept current by IB order events instead of polling
+open_order_sides = {}  # ib_insync order key -> ((symbol, expiry), action)
+open_order_counts = Counter()  # ((symbol, expiry), action) -> number of open orders
 
-def write_last_processed_id(last_id):
-    """Write the last processed ID to the file."""
-    with open(last_processed_file, "w") as file:
-        file.write(str(last_id))
+class LastIdStore:
+    """Keep the last processed ID in memory and persist it atomically when it changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.value = self._load()
+
+    def _load(self):
+        """Read the last processed ID from the file."""
+        try:
+            with open(self.path, "r") as file:
+                return int(file.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set(self, last_id):
+        """Write the last processed ID to the file, skipping unchanged values."""
+        if last_id == self.value:
+            return
+        # Write to a temp file and rename so a crash never leaves a torn file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(str(last_id))
+        os.replace(tmp_path, self.path)
+        self.value = last_id
 
 def fetch_trade_ideas():
     """Fetch trade ideas from the ASP script."""
     try:
-        response = requests.get(asp_url)
+        response = session.get(asp_url, headers=conditional_headers, timeout=10)
+        if response.status_code == 304:
+            return list(cached_trade_ideas)  # Nothing has changed since the last poll
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        trade_ideas = orjson.loads(response.content)
+        # Remember the ideas and validators for the next conditional request
+        cached_trade_ideas[:] = trade_ideas
+        conditional_headers.clear()
+        if "ETag" in response.headers:
+            conditional_headers["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            conditional_headers["If-Modified-Since"] = response.headers["Last-Modified"]
+        return trade_ideas
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching trade ideas: {e}")
         return []
 
-def fetch_latest_price(ib, contract):
+def fetch_latest_price(ib, contract, timeout=2):
     """Fetch the latest market price for the given contract."""
     ticker = ib.reqMktData(contract)
-    ib.sleep(2)  # Adjust the sleep duration based on the API's responsiveness
+
+    # Wake on each incoming update and stop as soon as a price arrives, up to the timeout
+    deadline = time.monotonic() + timeout
+    while not (ticker.last > 0 or ticker.close > 0):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not ib.waitOnUpdate(timeout=remaining):
+            break
+
     if ticker.last > 0:
         return ticker.last
     elif ticker.close > 0:
@@ -51,28 +99,40 @@ def fetch_latest_price(ib, contract):
     else:
         raise ValueError("Unable to fetch the latest price for the contract.")
 
-def check_order_limit(ib, contract):
+def update_order_counts(ib, trade):
+    """Track an order's open/closed state from IB new-order and order-status events."""
+    # orderId alone is not unique: other API clients number orders separately and
+    # manual TWS orders all have orderId 0, so key on what ib_insync itself uses
+    order = trade.order
+    order_key = ib.wrapper.orderKey(order.clientId, order.orderId, order.permId)
+    if trade.isActive():
+        if order_key not in open_order_sides:
+            key = (trade.contract.symbol, trade.contract.lastTradeDateOrContractMonth)
+            open_order_sides[order_key] = (key, trade.order.action)
+            open_order_counts[open_order_sides[order_key]] += 1
+    elif order_key in open_order_sides:
+        open_order_counts[open_order_sides.pop(order_key)] -= 1
+
+def track_open_orders(ib):
+    """Seed the open order counts once and keep them updated from IB events."""
+    for trade in ib.reqAllOpenOrders():
+        update_order_counts(ib, trade)
+    on_order_update = functools.partial(update_order_counts, ib)
+    ib.newOrderEvent += on_order_update
+    ib.orderStatusEvent += on_order_update
+
+def check_order_limit(contract):
     """Check the number of orders on the contract's buy and sell side."""
-    open_orders = ib.reqAllOpenOrders()  # Fetch open orders (Order objects)
-    buy_orders = 0
-    sell_orders = 0
-
-    # Count orders for the specified contract
-    for order in open_orders:
-        if isinstance(order, Order):  # Ensure that we are checking Order objects
-            # Ensure we are checking orders related to the correct contract
-            if order.contract.symbol == contract.symbol and order.contract.lastTradeDateOrContractMonth == contract.lastTradeDateOrContractMonth:
-                if order.action == "BUY":
-                    buy_orders += 1
-                elif order.action == "SELL":
-                    sell_orders += 1
+    key = (contract.symbol, contract.lastTradeDateOrContractMonth)
+    buy_orders = open_order_counts[(key, "BUY")]
+    sell_orders = open_order_counts[(key, "SELL")]
 
     print(f"Open Buy Orders: {buy_orders}, Open Sell Orders: {sell_orders}")
     return buy_orders, sell_orders
 
 def place_orders_if_under_limit(ib, contract, orders):
     """Place orders only if the total open orders on either side are under the limit."""
-    buy_orders, sell_orders = check_order_limit(ib, contract)
+    buy_orders, sell_orders = check_order_limit(contract)
 
     if buy_orders < 15 and sell_orders < 15:
         for order in orders:
@@ -108,36 +168,40 @@ def bracket_order(parent_order_id, action, quantity, entry_price, stop_loss_offs
 
     return [parent, take_profit, stop_loss]
 
-def process_trade_idea(trade, ib, config):
+def process_trade_idea(trade, ib, order_cfg, contract_template):
     """Process an individual trade idea."""
     print(f"Processing Trade ID {trade['ID']}")
     symbol = trade['Symbol']
     action = trade['BuySell']
-    
-    # Fetch config values from the ORDER section
-    entry_price_offset = float(config["ORDER"]["entry_price_offset"])
-    stop_loss_offset = float(config["ORDER"]["stop_loss_price"])
-    limit_price_offset = float(config["ORDER"]["limit_price"])
+
+    # Offsets from the ORDER section, parsed once at startup
+    entry_price_offset = order_cfg.entry_offset
+    stop_loss_offset = order_cfg.stop_offset
+    limit_price_offset = order_cfg.limit_offset
 
     # Convert SPX to MES if needed
     if symbol in symbol_map:
         symbol = symbol_map[symbol]
 
-    # Extract contract details
-    contract_details = config['CONTRACT']
-    contract = Future(
-        symbol=symbol,
-        lastTradeDateOrContractMonth=contract_details['expiry'],
-        exchange=contract_details['exchange'],
-        currency=contract_details['currency']
+    # Qualify the contract once per (symbol, expiry, exchange, currency) and reuse it
+    cache_key = (
+        symbol,
+        contract_template.lastTradeDateOrContractMonth,
+        contract_template.exchange,
+        contract_template.currency
     )
-
-    # Fetch the latest market price
-    qualified_contract = ib.qualifyContracts(contract)
+    qualified_contract = qualified_contract_cache.get(cache_key)
+    if qualified_contract is None:
+        contract = copy.copy(contract_template)
+        contract.symbol = symbol
+        qualified_contract = ib.qualifyContracts(contract)
+        if qualified_contract:
+            qualified_contract_cache[cache_key] = qualified_contract
     if not qualified_contract:
         print(f"Contract qualification failed for Trade ID {trade['ID']}.")
         return
 
+    # Fetch the latest market price
     latest_price = fetch_latest_price(ib, qualified_contract[0])
 
     # Adjust prices based on latest market price and offset
@@ -163,9 +227,10 @@ def process_trade_idea(trade, ib, config):
     # Only place orders if under the order limit
     place_orders_if_under_limit(ib, qualified_contract[0], bracket_orders)
 
-def poll_cashbox_service(config):
+def poll_cashbox_service(order_cfg, contract_template):
     """Poll the ASP script for new trade ideas."""
-    last_processed_id = read_last_processed_id()
+    last_processed_store = LastIdStore(last_processed_file)
+    last_processed_id = last_processed_store.value
 
     # Connect to IB
     ib = IB()
@@ -175,19 +240,27 @@ def poll_cashbox_service(config):
         print(f"API connection failed: {e}")
         return
 
+    track_open_orders(ib)
+
     while True:
         print("Polling for new trade ideas...")
         trade_ideas = fetch_trade_ideas()
 
         if trade_ideas:
-            trade_ideas = sorted(trade_ideas, key=lambda x: x['ID'])
+            # Coerce IDs to int once so sorting and comparisons are numeric
             for trade in trade_ideas:
-                if last_processed_id is None or int(trade['ID']) > last_processed_id:
-                    process_trade_idea(trade, ib, config)
-                    last_processed_id = int(trade['ID'])
-                    write_last_processed_id(last_processed_id)
-                else:
-                    print(f"Ignoring Trade ID {trade['ID']} (already processed)")
+                trade['ID'] = int(trade['ID'])
+            trade_ideas.sort(key=lambda x: x['ID'])
+            try:
+                for trade in trade_ideas:
+                    if last_processed_id is None or trade['ID'] > last_processed_id:
+                        process_trade_idea(trade, ib, order_cfg, contract_template)
+                        last_processed_id = trade['ID']
+                    else:
+                        print(f"Ignoring Trade ID {trade['ID']} (already processed)")
+            finally:
+                # Persist once per batch, even if a trade failed part-way through
+                last_processed_store.set(last_processed_id)
 
         else:
             print("No new trade ideas found.")
@@ -222,6 +295,19 @@ if __name__ == "__main__":
     config = configparser.ConfigParser()
     config.read(config_file_path)
 
+    # Parse the ORDER offsets and build the contract template once instead of per trade
+    order_cfg = SimpleNamespace(
+        entry_offset=float(config["ORDER"]["entry_price_offset"]),
+        stop_offset=float(config["ORDER"]["stop_loss_price"]),
+        limit_offset=float(config["ORDER"]["limit_price"])
+    )
+    contract_template = Future(
+        symbol=config["CONTRACT"]["symbol"],
+        lastTradeDateOrContractMonth=config["CONTRACT"]["expiry"],
+        exchange=config["CONTRACT"]["exchange"],
+        currency=config["CONTRACT"]["currency"]
+    )
+
     # Run the polling script
-    poll_cashbox_service(config)
+    poll_cashbox_service(order_cfg, contract_template)
 
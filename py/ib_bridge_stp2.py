@@ -1,24 +1,103 @@
 import os
 import sys
-import time
+import asyncio
+import functools
+import itertools
+import logging
+import math
+import operator
+import aiohttp
+import orjson
 import requests
 import urllib3
 import configparser
-from ib_insync import IB, Future, StopLimitOrder, LimitOrder, StopOrder
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ib_insync import IB, Contract, Future
+
+logging.basicConfig(
+    level=os.environ.get('LOGLEVEL', 'INFO'),
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+log = logging.getLogger('ib_bridge')
 
 # Disable SSL warnings (only for testing purposes)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 MAX_ORDERS = 15
-ORDER_ID_COUNTER = None  # Global counter for unique order IDs
+POLL_INTERVAL = 30  # Seconds between the starts of consecutive polls
+STREAM_READ_TIMEOUT = 60  # Seconds of silence after which the trade idea stream is treated as dead
+MAX_TRADE_ATTEMPTS = 3  # Failed attempts before a trade idea is skipped so later ideas can proceed
+
+# Per-action price direction (ib.bracketOrder picks the closing action itself)
+_SIDE = {
+    'BUY': +1,
+    'SELL': -1,
+}
+ACK_STATUSES = {'PreSubmitted', 'Submitted', 'Filled'}  # Order states that mean IB accepted it
+ACK_TIMEOUT = 0.5  # TWS normally acknowledges within tens of ms
+
+# Pooled HTTP session so each poll reuses a keep-alive connection
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.verify = False  # Disable SSL verification
+
+# Validators from the last response, sent back so unchanged polls return 304 Not Modified
+CONDITIONAL_HEADERS = {}
+# Trade ideas from that response, replayed on a 304 so ideas a failed batch left unprocessed are retried
+CACHED_TRADE_IDEAS = []
+
+# Failed processing attempts per trade ID, cleared once the trade is placed or given up on
+TRADE_FAILURES = Counter()
+
+@dataclass(frozen=True, slots=True)
+class OrderParams:
+    """Order settings parsed once from the ORDER section of the config."""
+    quantity: int
+    stop_offset: float
+    limit_offset: float
+    stop_loss_offset: float
+    take_profit_offset: float
+
+    @classmethod
+    def from_config(cls, order_config):
+        return cls(
+            quantity=int(order_config["quantity"]),
+            stop_offset=abs(float(order_config["stop_offset"])),
+            limit_offset=abs(float(order_config["limit_offset"])),
+            stop_loss_offset=abs(float(order_config["stop_loss_offset"])),
+            take_profit_offset=abs(float(order_config["take_profit_offset"]))
+        )
+
+@dataclass(frozen=True, slots=True)
+class OrderContext:
+    """Per-run state shared by every trade: parsed settings, contract and order ID source."""
+    params: OrderParams
+    contract: Contract        # Fully resolved contract, used for market data
+    order_contract: Contract  # conId-only contract, so orders skip server-side lookup
+    next_id: Callable[[], int]
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(file_path, mtime):
+    """Parse an INI-style .cfg file; the modification time is part of the cache key so edits are picked up."""
+    config = configparser.ConfigParser()
+    config.read(file_path, encoding='utf-8')  # Ensure UTF-8 encoding
+    return config
 
 def load_config(file_path):
     """Load the configuration from an INI-style .cfg file."""
-    config = configparser.ConfigParser()
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Configuration file '{file_path}' not found.")
-    config.read(file_path, encoding='utf-8')  # Ensure UTF-8 encoding
-    return config
+    return _load_config_cached(file_path, os.path.getmtime(file_path))
 
 def read_last_processed_id(file_path):
     """Read the last processed ID from the file."""
@@ -26,197 +105,315 @@ def read_last_processed_id(file_path):
         with open(file_path, "r") as file:
             try:
                 last_id = int(file.read().strip())
-                print(f"Last processed ID read: {last_id}")
+                log.info("Last processed ID read: %s", last_id)
                 return last_id
             except ValueError:
-                print("Invalid last processed ID. Starting from scratch.")
+                log.warning("Invalid last processed ID. Starting from scratch.")
                 return 0
-    print("No last processed ID file found. Starting from scratch.")
+    log.info("No last processed ID file found. Starting from scratch.")
     return 0
 
 def write_last_processed_id(last_id, file_path):
-    """Write the last processed ID to the file."""
-    with open(file_path, "w") as file:
+    """Atomically write the last processed ID to the file."""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w") as file:
         file.write(str(last_id))
-        print(f"Last processed ID updated to: {last_id}")
+    os.replace(tmp_path, file_path)
+    log.info("Last processed ID updated to: %s", last_id)
 
 def fetch_trade_ideas(url):
     """Fetch trade ideas from the service with SSL verification disabled."""
     try:
-        response = requests.get(url, verify=False)  # Disable SSL verification
+        response = SESSION.get(url, headers=CONDITIONAL_HEADERS, timeout=(3, 10))
+        if response.status_code == 304:
+            return list(CACHED_TRADE_IDEAS)  # Nothing has changed since the last poll
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching trade ideas: {e}")
+        trade_ideas = orjson.loads(response.content)
+        # Remember the ideas and validators for the next conditional request
+        CACHED_TRADE_IDEAS[:] = trade_ideas
+        CONDITIONAL_HEADERS.clear()
+        if "ETag" in response.headers:
+            CONDITIONAL_HEADERS["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            CONDITIONAL_HEADERS["If-Modified-Since"] = response.headers["Last-Modified"]
+        return trade_ideas
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        log.error("Error fetching trade ideas: %s", e)
         return []
 
-def fetch_latest_price(ib, contract):
-    """Fetch the latest market price for the given contract."""
+class StreamUnsupported(Exception):
+    """The service does not offer a server-sent events stream of trade ideas."""
+
+async def stream_trade_ideas(url):
+    """Yield trade ideas as the service pushes them over server-sent events."""
+    # sock_read makes a silently dead connection raise instead of blocking forever;
+    # keep it above the service's keep-alive interval
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=3, sock_read=STREAM_READ_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(url, headers={'Accept': 'text/event-stream'}, ssl=False) as response:
+            if response.status == 404:
+                raise StreamUnsupported(f"{url} returned 404")
+            response.raise_for_status()  # Transient server errors reconnect rather than disable streaming
+            if response.content_type != 'text/event-stream':
+                raise StreamUnsupported(f"{url} returned {response.content_type}")
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue  # Skip comments, keep-alives and other SSE fields
+                payload = orjson.loads(line[5:])
+                for trade in payload if isinstance(payload, list) else [payload]:
+                    yield trade
+
+async def fetch_latest_price(ib, contract, timeout=2.0):
+    """Fetch the latest market price for the given contract as soon as a tick arrives."""
     retry_count = 3
-    for attempt in range(retry_count):
-        ticker = ib.reqMktData(contract)
-        ib.sleep(2)
-        if ticker.last > 0:
-            return ticker.last
-        elif ticker.close > 0:
-            return ticker.close
-        print(f"Retry {attempt + 1}/{retry_count} fetching market price for {contract.symbol}...")
+    ticker = ib.reqMktData(contract, '', False, False)
+    # ib_insync reuses one Ticker per contract and cancelMktData keeps its last values,
+    # so clear them and only accept ticks that arrive for this request
+    ticker.last = ticker.close = math.nan
+    done = asyncio.Event()
+
+    def on_tick(tickers):
+        if ticker.last > 0 or ticker.close > 0:
+            done.set()
+
+    ib.pendingTickersEvent += on_tick
+    try:
+        for attempt in range(retry_count):
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("Retry %d/%d fetching market price for %s...", attempt + 1, retry_count, contract.symbol)
+                continue
+            return ticker.last if ticker.last > 0 else ticker.close
+    finally:
+        ib.pendingTickersEvent -= on_tick
+        ib.cancelMktData(contract)
     raise ValueError(f"Unable to fetch the latest price for {contract.symbol}.")
 
-def initialize_order_id(ib):
-    """Initialize a global counter for unique order IDs."""
-    global ORDER_ID_COUNTER
-    if ORDER_ID_COUNTER is None:
-        ORDER_ID_COUNTER = ib.client.getReqId()
+async def wait_for_order_ack(ib, trade, timeout=ACK_TIMEOUT):
+    """Wait until IB reports the order as accepted; return False if it times out."""
+    order_id = trade.order.orderId
+    acked = asyncio.Event()
 
-def get_next_order_id():
-    """Increment and return the next unique order ID."""
-    global ORDER_ID_COUNTER
-    ORDER_ID_COUNTER += 1
-    return ORDER_ID_COUNTER
+    def on_status(updated):
+        if updated.order.orderId == order_id and updated.orderStatus.status in ACK_STATUSES:
+            acked.set()
 
-def bracket_order(action, quantity, stop_price, limit_price, stop_loss_price, take_profit_price):
+    ib.orderStatusEvent += on_status
+    try:
+        on_status(trade)  # The status may already have arrived
+        await asyncio.wait_for(acked.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        log.warning("No acknowledgement for order %s within %ss.", order_id, timeout)
+        return False
+    finally:
+        ib.orderStatusEvent -= on_status
+
+def make_order_id_gen(ib):
+    """Return a callable yielding unique order IDs after the client's current request ID."""
+    return itertools.count(ib.client.getReqId() + 1).__next__
+
+def bracket_order(ib, ctx, action, stop_price, limit_price, stop_loss_price, take_profit_price):
     """Create and return bracket orders (parent, take-profit, stop-loss) with unique IDs."""
-    parent_order_id = get_next_order_id()
-
-    # Parent (entry) stop-limit order
-    parent = StopLimitOrder(
-        action=action,
-        totalQuantity=quantity,
-        stopPrice=stop_price,
-        lmtPrice=limit_price
-    )
-    parent.orderId = parent_order_id
-    parent.transmit = False
-
-    # Take-profit order
-    take_profit = LimitOrder(
-        action='SELL' if action == 'BUY' else 'BUY',
-        totalQuantity=quantity,
-        lmtPrice=take_profit_price
-    )
-    take_profit.orderId = get_next_order_id()
-    take_profit.parentId = parent_order_id
-    take_profit.transmit = False
-
-    # Stop-loss order
-    stop_loss = StopOrder(
-        action='SELL' if action == 'BUY' else 'BUY',
-        totalQuantity=quantity,
-        stopPrice=stop_loss_price
+    # ib_insync links the chain and sets transmit=True only on the stop-loss
+    parent, take_profit, stop_loss = ib.bracketOrder(
+        action, ctx.params.quantity,
+        limitPrice=limit_price,
+        takeProfitPrice=take_profit_price,
+        stopLossPrice=stop_loss_price
     )
-    stop_loss.orderId = get_next_order_id()
-    stop_loss.parentId = parent_order_id
-    stop_loss.transmit = True  # This transmits the entire chain
+
+    # Parent (entry) is a stop-limit order
+    parent.orderType = 'STP LMT'
+    parent.auxPrice = stop_price
+    parent.orderId = ctx.next_id()
+
+    # Exits cancel each other as one OCA group; the parent stays out so its fill does not cancel them
+    oca_group = f"br-{parent.orderId}"
+    for child in (take_profit, stop_loss):
+        child.orderId = ctx.next_id()
+        child.parentId = parent.orderId
+        child.ocaGroup = oca_group
+        child.ocaType = 1
 
     return [parent, take_profit, stop_loss]
 
-def process_trade_idea(trade, ib, config):
+async def process_trade_idea(trade, ib, ctx):
     """Process an individual trade idea."""
-    print(f"Processing Trade ID {trade['ID']} from source: {trade.get('source', 'Unknown')}")
+    log.info("Processing Trade ID %s from source: %s", trade['ID'], trade.get('source', 'Unknown'))
     action_map = {'L': 'BUY', 'S': 'SELL'}
     action = trade.get('BuySell', '').strip().upper()
     if action not in action_map:
-        print(f"⚠️ Invalid action '{action}' for Trade ID {trade['ID']}. Skipping.")
+        log.warning("Invalid action '%s' for Trade ID %s. Skipping.", action, trade['ID'])
         return
 
     action = action_map[action]
-    print(f"Mapped action for Trade ID {trade['ID']}: {action}")
+    log.info("Mapped action for Trade ID %s: %s", trade['ID'], action)
 
-    # Read order details from the config
-    order_config = config["ORDER"]
-    quantity = int(order_config["quantity"])
-    stop_offset = float(order_config["stop_offset"])
-    limit_offset = float(order_config["limit_offset"])
-    stop_loss_offset = float(order_config["stop_loss_offset"])
-    take_profit_offset = float(order_config["take_profit_offset"])
+    params = ctx.params
+    latest_price = await fetch_latest_price(ib, ctx.contract)
 
-    contract = Future(
-        symbol=config["CONTRACT"]["symbol"],
-        lastTradeDateOrContractMonth=config["CONTRACT"]["expiry"],
-        exchange=config["CONTRACT"]["exchange"],
-        currency=config["CONTRACT"]["currency"]
-    )
-
-    qualified_contract = ib.qualifyContracts(contract)
-    if not qualified_contract:
-        print(f"⚠️ Contract qualification failed for Trade ID {trade['ID']}.")
-        return
-
-    latest_price = fetch_latest_price(ib, qualified_contract[0])
-
-    # Calculate order prices based on action
-    if action == 'BUY':
-        stop_price = latest_price + abs(stop_offset)
-        limit_price = latest_price + abs(limit_offset)
-        stop_loss_price = stop_price + stop_loss_offset  # stop_loss_offset should be negative
-        take_profit_price = stop_price + abs(take_profit_offset)
-    elif action == 'SELL':
-        stop_price = latest_price - abs(stop_offset)
-        limit_price = latest_price - abs(limit_offset)
-        stop_loss_price = stop_price + abs(stop_loss_offset)
-        take_profit_price = stop_price - abs(take_profit_offset)
-    else:
-        print(f"Invalid action '{action}' for Trade ID {trade['ID']}. Skipping.")
-        return
+    # Offsets are stored as magnitudes; the sign points them with the trade
+    sign = _SIDE[action]
+    stop_price = latest_price + sign * params.stop_offset
+    limit_price = latest_price + sign * params.limit_offset
+    stop_loss_price = stop_price - sign * params.stop_loss_offset
+    take_profit_price = stop_price + sign * params.take_profit_offset
 
-    print(f"Latest Price: {latest_price}")
-    print(f"Stop Price: {stop_price}, Limit Price: {limit_price}, Stop Loss: {stop_loss_price}, Take Profit: {take_profit_price}")
-
-    # Initialize global order ID counter
-    initialize_order_id(ib)
+    log.info("Latest Price: %s", latest_price)
+    log.info("Stop Price: %s, Limit Price: %s, Stop Loss: %s, Take Profit: %s",
+             stop_price, limit_price, stop_loss_price, take_profit_price)
 
     # Create bracket orders
     bracket_orders = bracket_order(
-        action, quantity, stop_price, limit_price, stop_loss_price, take_profit_price
+        ib, ctx, action, stop_price, limit_price, stop_loss_price, take_profit_price
     )
 
-    # Log and place orders
+    # Log and place orders back to back, then wait only as long as IB takes to accept the parent
+    placed = []
     for order in bracket_orders:
-        print(f"Placing order: {order}")
-        ib.placeOrder(qualified_contract[0], order)
-
-    ib.sleep(2)  # Allow IB time to process orders
-
-def poll_cashbox_service(config):
+        log.info("Placing order: %s", order)
+        placed.append(ib.placeOrder(ctx.order_contract, order))
+
+    await wait_for_order_ack(ib, placed[0])
+
+async def handle_trade_ideas(trade_ideas, ib, ctx, source, last_processed_id, last_processed_file):
+    """
+    Place orders for trade ideas newer than last_processed_id and return the new last ID.
+    A trade that fails stops the batch, so it and the ones after it are retried in ID order;
+    after MAX_TRADE_ATTEMPTS failures it is skipped so it cannot block later ideas.
+    """
+    # Keep only trades with IDs greater than the last_processed_id, so just those get sorted
+    new_trades = []
+    for trade in trade_ideas:
+        trade_id = int(trade["ID"])
+        if trade_id > last_processed_id:
+            trade["_id"] = trade_id
+            new_trades.append(trade)
+    if len(new_trades) < len(trade_ideas):
+        log.debug("Ignoring %d trade ideas (already processed or below last_processed_id %s)",
+                  len(trade_ideas) - len(new_trades), last_processed_id)
+
+    # Sort trades by ID to ensure we process in order
+    new_trades.sort(key=operator.itemgetter("_id"))
+
+    for trade in new_trades:
+        trade_id = trade["_id"]
+        trade["source"] = source
+        log.info("Processing new Trade ID %s", trade_id)
+        try:
+            await process_trade_idea(trade, ib, ctx)
+        except Exception:
+            TRADE_FAILURES[trade_id] += 1
+            if TRADE_FAILURES[trade_id] < MAX_TRADE_ATTEMPTS:
+                log.exception("Failed to process Trade ID %s (attempt %d/%d); it will be retried.",
+                              trade_id, TRADE_FAILURES[trade_id], MAX_TRADE_ATTEMPTS)
+                break
+            log.exception("Giving up on Trade ID %s after %d failed attempts.", trade_id, MAX_TRADE_ATTEMPTS)
+        TRADE_FAILURES.pop(trade_id, None)
+        last_processed_id = trade_id
+        write_last_processed_id(last_processed_id, last_processed_file)
+    return last_processed_id
+
+async def poll_cashbox_service(config):
     """Poll the service for new trade ideas and handle new trades."""
     ib = IB()
     try:
-        ib.connect('127.0.0.1', 7496, clientId=2)
+        await ib.connectAsync('127.0.0.1', 7496, clientId=2)
     except Exception as e:
-        print(f"API connection failed: {e}")
+        log.error("API connection failed: %s", e)
         return
 
+    # The contract comes from static config, so resolve it once per run
+    contract = Future(
+        symbol=config["CONTRACT"]["symbol"],
+        lastTradeDateOrContractMonth=config["CONTRACT"]["expiry"],
+        exchange=config["CONTRACT"]["exchange"],
+        currency=config["CONTRACT"]["currency"]
+    )
+    details = await ib.reqContractDetailsAsync(contract)
+    if len(details) != 1:
+        log.error("Contract details lookup failed (%d matches).", len(details))
+        ib.disconnect()
+        return
+    resolved = details[0].contract
+    ctx = OrderContext(
+        params=OrderParams.from_config(config["ORDER"]),
+        contract=resolved,
+        order_contract=Contract(conId=resolved.conId, exchange=resolved.exchange),
+        next_id=make_order_id_gen(ib)
+    )
+
     service_url = config["SERVICE"]["url"]
+    stream_url = config["SERVICE"].get("stream_url")  # Optional SSE endpoint
+    source = config["ORDER"]["source"]
+    backoff = 1
     last_processed_file = os.path.abspath("last_processed_id.txt")
+    # Only this process writes the file, so read it once and track it in memory
+    last_processed_id = read_last_processed_id(last_processed_file)
 
-    while True:
-        # Dynamically re-read last_processed_id at the start of each polling cycle
-        last_processed_id = read_last_processed_id(last_processed_file)
-
-        print("Polling for new trade ideas...")
-        trade_ideas = fetch_trade_ideas(service_url)
-        if trade_ideas:
-            # Sort trades by ID to ensure we process in order
-            trade_ideas = sorted(trade_ideas, key=lambda t: int(t["ID"]))
-
-            for trade in trade_ideas:
-                trade_id = int(trade["ID"])
-                trade["source"] = config["ORDER"]["source"]
-
-                # Process trades with IDs greater than the last_processed_id
-                if trade_id > last_processed_id:
-                    print(f"Processing new Trade ID {trade_id}")
-                    process_trade_idea(trade, ib, config)
-                    last_processed_id = trade_id
-                    write_last_processed_id(last_processed_id, last_processed_file)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            # Measure the interval from the start of the cycle so processing time does not stretch it
+            deadline = loop.time() + POLL_INTERVAL
+            log.debug("Polling for new trade ideas...")
+            # Blocking HTTP runs in a worker thread so IB events keep flowing on the loop
+            trade_ideas = await asyncio.to_thread(fetch_trade_ideas, service_url)
+            if trade_ideas:
+                last_processed_id = await handle_trade_ideas(
+                    trade_ideas, ib, ctx, source, last_processed_id, last_processed_file
+                )
+            else:
+                log.debug("No new trade ideas found.")
+
+            if not stream_url:
+                remaining = deadline - loop.time()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
                 else:
-                    print(f"Ignoring Trade ID {trade_id} (already processed or below last_processed_id)")
-        else:
-            print("No new trade ideas found.")
-        time.sleep(30)  # Poll every 30 seconds
+                    log.warning("Poll cycle overran the %ss interval by %.1fs.", POLL_INTERVAL, -remaining)
+                continue
 
-    ib.disconnect()
+            # Having caught up by polling, wait for ideas to be pushed as they are published
+            stream = stream_trade_ideas(stream_url)
+            try:
+                while True:
+                    # Only reading and parsing the stream count as stream failures
+                    try:
+                        trade = await anext(stream)
+                    except StopAsyncIteration:
+                        log.info("Trade idea stream closed by the service.")
+                        break
+                    except StreamUnsupported as e:
+                        log.warning("Streaming not available (%s). Falling back to polling.", e)
+                        stream_url = None
+                        break
+                    except (aiohttp.ClientError, ValueError) as e:
+                        log.warning("Trade idea stream dropped: %s", e)
+                        break
+
+                    backoff = 1
+                    last_processed_id = await handle_trade_ideas(
+                        [trade], ib, ctx, source, last_processed_id, last_processed_file
+                    )
+                    # A new idea that is still above the last processed ID failed; go back through
+                    # the catch-up poll so it is retried before any later idea is placed
+                    if trade.get("_id", last_processed_id) > last_processed_id:
+                        break
+            finally:
+                await stream.aclose()
+
+            if not stream_url:
+                await asyncio.sleep(max(0, deadline - loop.time()))
+                continue
+            log.info("Reconnecting to the trade idea stream in %ss...", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+    finally:
+        ib.disconnect()
 
 
 if __name__ == "__main__":
@@ -232,4 +429,4 @@ if __name__ == "__main__":
         sys.exit(1)
 
     config = load_config(config_file_path)
-    poll_cashbox_service(config)
+    asyncio.run(poll_cashbox_service(config))
@@ -1,5 +1,7 @@
 import os
-import requests
+import zlib
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 
 file1_path = r"C:\CoralBayT\reports\total_pnl.csv"
 file2_path = r"C:\CoralBayT\reports\trades.csv"
@@ -7,12 +9,40 @@ file2_path = r"C:\CoralBayT\reports\trades.csv"
 # Define the target URL
 upload_url = "http://via-trader.com/cbt/"  # Replace with your website's upload endpoint
 
+# Only enable for endpoints known to decode "Content-Encoding: gzip" request bodies
+gzip_upload = False
+
+# Shared client so uploads reuse pooled keep-alive connections
+client = httpx.Client(
+    limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+    timeout=30.0
+)
+
+def post_file(url, file_path, file, gzip_body=False):
+    """POST a file as a streamed multipart form, gzip-encoding the body only when asked to."""
+    files = {'file': (os.path.basename(file_path), file, 'text/csv')}
+    if not gzip_body:
+        return client.post(url, files=files)  # httpx streams the file part from disk
+
+    # Compress the multipart stream httpx builds, chunk by chunk as the file is read
+    request = client.build_request("POST", url, files=files)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+
+    def compressed():
+        for chunk in request.stream:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    headers = {"Content-Type": request.headers["Content-Type"], "Content-Encoding": "gzip"}
+    return client.post(url, content=compressed(), headers=headers)
+
 # Function to upload a file
 def upload_file(file_path):
     try:
         with open(file_path, 'rb') as file:
-            files = {'file': (os.path.basename(file_path), file)}
-            response = requests.post(upload_url, files=files)
+            response = post_file(upload_url, file_path, file, gzip_body=gzip_upload)
             
             if response.status_code == 200:
                 print(f"Uploaded {os.path.basename(file_path)} successfully!")
@@ -22,6 +52,7 @@ def upload_file(file_path):
     except Exception as e:
         print(f"Error uploading {file_path}: {e}")
 
-# Upload the files
-upload_file(file1_path)
-upload_file(file2_path)
+if __name__ == "__main__":
+    # Upload the files concurrently over the shared client
+    with client, ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(upload_file, [file1_path, file2_path]))
@@ -1,11 +1,13 @@
-import requests
+from upload_csv import client, post_file
 
 url = "http://www.viatrader.com/cbt/tickdata"
 file_path = r"C:\CoralBayT\reports\total_pnl.csv"
 
-with open(file_path, 'rb') as file:
-    files = {'file': file}
-    response = requests.post(url, files=files)
+# Only enable for endpoints known to decode "Content-Encoding: gzip" request bodies
+gzip_upload = False
+
+with client, open(file_path, 'rb') as file:
+    response = post_file(url, file_path, file, gzip_body=gzip_upload)
 
 print("Status Code:", response.status_code)
 print("Response Text:", response.text)